@@ -1,8 +1,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import io
-import requests
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import fsspec
+import re
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+_COLNAME_PUNCT = re.compile(r"[^\w\s]")
 
 
 # BASIC CONFIG
@@ -12,35 +20,58 @@ st.set_page_config(
 )
 
 # DATA LAYER
+# Only these columns are ever used downstream; projecting at the Parquet
+# reader skips decoding the other ~40 columns entirely.
+KEEP_COLS = [
+    "order date (DateOrders)",
+    "shipping date (DateOrders)",
+    "Days for shipping (real)",
+    "Order Region",
+    "Category Name",
+    "Customer Segment",
+    "Shipping Mode",
+    "Sales",
+    "Order Profit Per Order",
+    "Late_delivery_risk",
+    "Order Id",
+]
+
+# Cleaned-dataset cache: written after the first full pipeline run so later
+# cold starts skip the download and cleaning entirely.
+CLEAN_CACHE = Path(__file__).with_name("clean_cache.parquet")
+
 @st.cache_data
 def load_raw():
     url = "https://raw.githubusercontent.com/Yogeswarachary/DHL_Inventory_Project/main/Data/DHL_Project.parquet"
-    response = requests.get(url)
-    response.raise_for_status()  # ensure file downloaded
-    df = pd.read_parquet(io.BytesIO(response.content))
-    return df
+    # fsspec's HTTPS filesystem gives pyarrow range reads: it fetches the
+    # footer and only the projected columns' pages, instead of buffering the
+    # whole file in memory and decoding it from there.
+    dataset = ds.dataset(url, format="parquet", filesystem=fsspec.filesystem("https"))
+    table = dataset.to_table(columns=KEEP_COLS)
+    # Arrow-backed dtypes: strings stay as Arrow strings (no object-dtype
+    # boxing) and numerics are zero-copy views of the Arrow buffers.
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
 
 @st.cache_data
 def build_dataset():
-    df = load_raw()
+    # Warm cold-start path: the default backend restores the pandas dtypes
+    # recorded at write time (categoricals, int16 lead times, ...).
+    if CLEAN_CACHE.exists():
+        return pd.read_parquet(CLEAN_CACHE)
 
-    # Drop sensitive / unused columns (just like code notebook)
-    drop_cols = [
-        "Customer Password", "Customer Street", "Customer Zipcode",
-        "Order zipcode", "Product Image", "Product Description",
-        "Product Card Id",
-    ]
-    df_clean = df.drop(columns=[c for c in drop_cols if c in df.columns])
+    # Sensitive / unused columns (PII, images, ids) never leave the Parquet
+    # file: load_raw projects down to KEEP_COLS, so nothing to drop here.
+    df_clean = load_raw()
 
-    # Handle missing values (same strategy as notebook)
+    # Handle missing values (same strategy as notebook), block-wise instead of
+    # one Python-level pass per column.
     num_cols = df_clean.select_dtypes(np.number).columns
-    for c in num_cols:
-        # future‑proof fillna
-        df_clean[c] = df_clean[c].ffill().fillna(0)
+    df_clean[num_cols] = df_clean[num_cols].ffill().fillna(0)
 
-    cat_cols = df_clean.select_dtypes("object").columns
-    for c in cat_cols:
-        df_clean[c] = df_clean[c].fillna(df_clean[c].mode()[0])
+    cat_cols = df_clean.select_dtypes(["object", "string"]).columns
+    if len(cat_cols):
+        modes = df_clean[cat_cols].mode().iloc[0]
+        df_clean[cat_cols] = df_clean[cat_cols].fillna(modes)
 
     # Convert to proper dates using ORIGINAL column names
     df_clean["order_date"] = pd.to_datetime(
@@ -50,38 +81,233 @@ def build_dataset():
         df_clean["shipping date (DateOrders)"], errors="coerce"
     )
 
-    # Lead time days (still with original col names available)
-    df_clean["lead_time_days"] = (df_clean["shipping_date"] - df_clean["order_date"]).dt.days
-    df_clean["lead_time_days"] = (
-        df_clean["lead_time_days"]
-        .fillna(df_clean["Days for shipping (real)"])
-        .clip(lower=0)
+    # Lead time days (still with original col names available).
+    # One vectorized pass on the int64 nanosecond views instead of
+    # Timedelta -> .dt.days -> fillna -> clip (four array allocations);
+    # int16 is plenty for lead times and halves bandwidth downstream.
+    NS_PER_DAY = 86_400_000_000_000
+    NAT = np.iinfo("i8").min
+    o = df_clean["order_date"].to_numpy("datetime64[ns]").view("i8")
+    s = df_clean["shipping_date"].to_numpy("datetime64[ns]").view("i8")
+    lt = (s - o) // NS_PER_DAY
+    fallback = df_clean["Days for shipping (real)"].to_numpy("i8")
+    lt = np.where((o == NAT) | (s == NAT), fallback, lt)
+    df_clean["lead_time_days"] = np.maximum(lt, 0).astype("int16")
+
+    # Normalize column names (snake_case) AFTER creating new columns.
+    # One pass per name instead of four chained Index string ops, each of
+    # which allocated a whole new Index.
+    df_clean.columns = [
+        _COLNAME_PUNCT.sub("", c).strip().lower().replace(" ", "_")
+        for c in df_clean.columns
+    ]
+
+    # After this, columns are: order_date, shipping_date, days_for_shipping_real, etc.
+
+    # Add order_month using the NEW normalized name.
+    # Month as a flat int32 (year * 12 + month): groupby hashes a 4-byte int
+    # per row instead of a string/Period object. month_label() turns it back
+    # into "YYYY-MM" at display time.
+    # order_date is parsed with errors="coerce", so NaT is possible; park
+    # those rows on sentinel code 0 (real months are >= 1) instead of letting
+    # the int cast raise on non-finite values.
+    od = df_clean["order_date"]
+    df_clean["order_month"] = (
+        (od.dt.year * 12 + od.dt.month).fillna(0).astype("int32")
     )
 
-    # Normalize column names (snake_case) AFTER creating new columns
-    df_clean.columns = (
-        df_clean.columns
-        .str.lower()
-        .str.replace(r"[^\w\s]", "", regex=True)
-        .str.replace(" ", "_")
-        .str.strip()
+    # Low-cardinality strings -> category dtype: groupby hashes int codes
+    # instead of Python strings and isin becomes an integer lookup.
+    for c in ["order_region", "category_name", "customer_segment", "shipping_mode"]:
+        df_clean[c] = df_clean[c].astype("category")
+
+    # Dictionary + zstd keeps the cache small (categoricals RLE/dict-encode
+    # well); best-effort, some hosts mount the app directory read-only.
+    try:
+        pq.write_table(
+            pa.Table.from_pandas(df_clean, preserve_index=False),
+            CLEAN_CACHE,
+            compression="zstd",
+            use_dictionary=True,
+        )
+    except OSError:
+        pass
+
+    return df_clean
+
+def month_label(code):
+    """Render an int32 month code (year * 12 + month) back as \"YYYY-MM\"."""
+    if code <= 0:  # sentinel for rows whose order_date failed to parse
+        return "unknown"
+    return f"{(code - 1) // 12}-{(code - 1) % 12 + 1:02d}"
+
+@st.cache_data
+def get_filter_options():
+    # .cat.categories is already unique and lexically sorted, so this is
+    # O(#categories); cached so reruns skip even that.
+    df = build_dataset()
+    return (
+        list(df["order_region"].cat.categories),
+        list(df["category_name"].cat.categories),
+        list(df["customer_segment"].cat.categories),
     )
 
-    # After this, columns are: order_date, shipping_date, days_for_shipping_real, etc.
+# AGGREGATION LAYER
+# Streamlit reruns the whole script on every widget change, so the filter mask
+# and every groupby were recomputed each interaction. Cache them keyed by the
+# (sorted) filter selections so repeat filter states are served instantly.
+#
+# All tab views share the same dimensions, so we aggregate the raw rows ONCE
+# into a cube keyed by (region, segment, category, shipping mode, month) and
+# derive every tab's table by summing over the cube (a few thousand rows)
+# instead of re-grouping 180k raw rows. Means are recovered as sum / n.
+CUBE_DIMS = [
+    "order_region",
+    "customer_segment",
+    "category_name",
+    "shipping_mode",
+    "order_month",
+]
 
-    # Add order_month using the NEW normalized name
-    df_clean["order_month"] = df_clean["order_date"].dt.to_period("M")
+@st.cache_data
+def build_cube():
+    df = build_dataset()
+    cube = df.groupby(CUBE_DIMS, observed=True).agg(
+        sales_sum=("sales", "sum"),
+        profit_sum=("order_profit_per_order", "sum"),
+        lt_sum=("lead_time_days", "sum"),
+        risk_sum=("late_delivery_risk", "sum"),
+        n=("order_id", "size"),
+    )
+    # order_id repeats for multi-item orders, so `size` would overcount and
+    # per-group nunique builds a hash set per cell. Dedupe the
+    # (dims, order_id) pairs once globally and count rows per cell instead.
+    # NOTE: orders span multiple categories, so these per-cell counts only
+    # roll up to exact distinct-order counts for groupings that keep
+    # category_name (e.g. cat_seg); coarser rollups must dedupe the raw rows.
+    cube["orders"] = (
+        df.drop_duplicates(CUBE_DIMS + ["order_id"])
+        .groupby(CUBE_DIMS, observed=True)
+        .size()
+    )
+    return cube.reset_index()
+
+def _filter_mask(df, regions, categories, segments):
+    # Mark the selected categories in a tiny boolean lookup table and gather
+    # it through the categorical integer codes: one byte-sized LUT read per
+    # row per column instead of a hashed string isin. The trailing False
+    # slot catches code -1 (NaN).
+    mask = np.ones(len(df), dtype=bool)
+    for col, selected in (
+        ("order_region", regions),
+        ("category_name", categories),
+        ("customer_segment", segments),
+    ):
+        cats = df[col].cat.categories
+        lut = np.zeros(len(cats) + 1, dtype=bool)
+        lut[cats.get_indexer(list(selected))] = True
+        mask &= lut[df[col].cat.codes.to_numpy()]
+    return mask
 
-    return df_clean
+@st.cache_data
+def filtered(regions, categories, segments):
+    df = build_dataset()
+    return df[_filter_mask(df, regions, categories, segments)]
+
+@st.cache_data
+def filtered_cube(regions, categories, segments):
+    cube = build_cube()
+    fcube = cube[_filter_mask(cube, regions, categories, segments)]
+    # Keep the slice ordered by the shared groupby keys (a no-op stable sort,
+    # since the cube comes out of groupby in this order) so downstream
+    # groupbys can pass sort=False and walk contiguous key runs.
+    return fcube.sort_values(
+        ["order_region", "customer_segment", "category_name"], kind="stable"
+    )
 
-df_clean = build_dataset()
+@st.cache_data
+def monthly_agg(regions, categories, segments):
+    # Hottest view (runs on every filter change), so skip pandas groupby
+    # machinery entirely: factorize the month once and reduce each measure
+    # with a weighted bincount over the integer codes.
+    fcube = filtered_cube(regions, categories, segments)
+    codes, months = pd.factorize(fcube["order_month"], sort=True)
+    n_months = len(months)
+
+    def reduce(col):
+        return np.bincount(
+            codes, weights=fcube[col].to_numpy("f8"), minlength=n_months
+        )
+
+    n = reduce("n")
+    # No orders column: only the sales and lead-time series are charted, and
+    # the cube's per-cell order counts would double-count orders that span
+    # several categories if summed per month.
+    return pd.DataFrame(
+        {
+            "order_month": [month_label(m) for m in months],
+            "total_sales": reduce("sales_sum"),
+            "avg_lead_time": reduce("lt_sum") / n,
+        }
+    )
+
+@st.cache_data
+def cat_seg_agg(regions, categories, segments):
+    fcube = filtered_cube(regions, categories, segments)
+    g = fcube.groupby(
+        ["category_name", "customer_segment"], sort=False, observed=True
+    )[
+        ["sales_sum", "profit_sum", "n", "orders"]
+    ].sum()
+    return (
+        pd.DataFrame(
+            {
+                "total_sales": g["sales_sum"],
+                "total_profit": g["profit_sum"],
+                "avg_margin": g["profit_sum"] / g["n"],
+                "orders": g["orders"],
+            }
+        ).reset_index()
+    )
+
+@st.cache_data
+def region_profit_agg(regions, categories, segments):
+    fcube = filtered_cube(regions, categories, segments)
+    g = fcube.groupby("order_region", sort=False, observed=True)[
+        ["sales_sum", "profit_sum", "n"]
+    ].sum()
+    return (
+        pd.DataFrame(
+            {
+                "total_sales": g["sales_sum"],
+                "total_profit": g["profit_sum"],
+                "avg_profit_per_order": g["profit_sum"] / g["n"],
+            }
+        ).reset_index()
+    )
+
+@st.cache_data
+def high_delay_agg(regions, categories, segments):
+    fcube = filtered_cube(regions, categories, segments)
+    g = fcube.groupby(
+        ["order_region", "shipping_mode"], sort=False, observed=True
+    )[
+        ["sales_sum", "risk_sum", "lt_sum", "n"]
+    ].sum()
+    return (
+        pd.DataFrame(
+            {
+                "total_sales": g["sales_sum"],
+                "late_risk": g["risk_sum"] / g["n"],
+                "avg_lead_time": g["lt_sum"] / g["n"],
+            }
+        ).reset_index()
+    )
 
 # SIDEBAR FILTERS
 st.sidebar.title("DHL Inventory Controls")
 
-regions = sorted(df_clean["order_region"].dropna().unique())
-categories = sorted(df_clean["category_name"].dropna().unique())
-segments = sorted(df_clean["customer_segment"].dropna().unique())
+regions, categories, segments = get_filter_options()
 
 region_filter = st.sidebar.multiselect(
     "Order Region", options=regions, default=regions
@@ -93,13 +319,33 @@ segment_filter = st.sidebar.multiselect(
     "Customer Segment", options=segments, default=segments
 )
 
-# Apply filters
-mask = (
-    df_clean["order_region"].isin(region_filter)
-    & df_clean["category_name"].isin(category_filter)
-    & df_clean["customer_segment"].isin(segment_filter)
+# Apply filters (sorted tuples so the cache key is order-independent)
+filter_key = (
+    tuple(sorted(region_filter)),
+    tuple(sorted(category_filter)),
+    tuple(sorted(segment_filter)),
 )
-data = df_clean[mask]
+data = filtered(*filter_key)
+fcube = filtered_cube(*filter_key)
+
+# Kick off the four tab aggregations together: pandas releases the GIL in
+# its numeric kernels, so on a cache miss these overlap across cores instead
+# of running back to back as each tab renders. Each worker thread needs the
+# script-run context attached for st.cache_data to resolve.
+_ctx = get_script_run_ctx()
+with ThreadPoolExecutor(
+    max_workers=4, initializer=add_script_run_ctx, initargs=(None, _ctx)
+) as _pool:
+    _futures = {
+        name: _pool.submit(fn, *filter_key)
+        for name, fn in [
+            ("monthly", monthly_agg),
+            ("cat_seg", cat_seg_agg),
+            ("region_profit", region_profit_agg),
+            ("high_delay", high_delay_agg),
+        ]
+    }
+    aggs = {name: f.result() for name, f in _futures.items()}
 
 st.sidebar.markdown("---")
 st.sidebar.write(f"Filtered rows: **{len(data):,}**")
@@ -121,41 +367,34 @@ tab_summary, tab_ops, tab_profit = st.tabs(
 with tab_summary:
     st.subheader("Portfolio KPIs (after filters)")
 
+    # KPIs fall out of the cube: totals are column sums, means are sum / n.
+    n_rows = fcube["n"].sum()
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.metric(
             "Total Sales (USD)",
-            f"{data['sales'].sum():,.0f}",
+            f"{fcube['sales_sum'].sum():,.0f}",
         )
     with col2:
         st.metric(
             "Total Profit (USD)",
-            f"{data['order_profit_per_order'].sum():,.0f}",
+            f"{fcube['profit_sum'].sum():,.0f}",
         )
     with col3:
         st.metric(
             "Avg Lead Time (days)",
-            round(data["lead_time_days"].mean(), 2),
+            round(fcube["lt_sum"].sum() / n_rows, 2) if n_rows else float("nan"),
         )
     with col4:
         st.metric(
             "Late Delivery Risk (mean)",
-            round(data["late_delivery_risk"].mean(), 3),
+            round(fcube["risk_sum"].sum() / n_rows, 3) if n_rows else float("nan"),
         )
 
     st.markdown("### Monthly trend Sales & Lead Time")
 
     if not data.empty:
-        monthly = (
-            data.groupby("order_month")
-            .agg(
-                total_sales=("sales", "sum"),
-                avg_lead_time=("lead_time_days", "mean"),
-                orders=("order_id", "nunique"),
-            )
-            .reset_index()
-        )
-        monthly["order_month"] = monthly["order_month"].astype(str)
+        monthly = aggs["monthly"]
 
         col_a, col_b = st.columns(2)
         with col_a:
@@ -199,86 +438,106 @@ with tab_ops:
     # Lead time distribution
     with col1:
         st.markdown("#### Lead Time distribution (days)")
+        # Tiny integer domain (0..~10 days): bincount is a single pass,
+        # no hash table like value_counts.
+        lt = data["lead_time_days"].to_numpy()
+        counts = np.bincount(lt, minlength=int(lt.max()) + 1 if lt.size else 1)
         st.bar_chart(
-            data["lead_time_days"].value_counts().sort_index(),
+            pd.Series(counts, name="lead_time_days"),
             height=260,
         )
 
     # Late risk by region and segment
     with col2:
         st.markdown("#### Late delivery risk region x segment")
+        # groupby + unstack over the cube instead of pd.crosstab over the raw
+        # rows: same table, none of crosstab's generic pivot machinery.
+        risk_g = fcube.groupby(
+            ["order_region", "customer_segment"], sort=False, observed=True
+        )[["risk_sum", "n"]].sum()
+        # unstack re-expands categorical levels to every category, so drop
+        # the all-empty rows/columns left by filtered-out selections.
         risk_crosstab = (
-            pd.crosstab(
-                data["order_region"],
-                data["customer_segment"],
-                values=data["late_delivery_risk"],
-                aggfunc="mean",
-            )
-            .round(3)
+            (risk_g["risk_sum"] / risk_g["n"])
+            .unstack()
+            .dropna(how="all")
+            .dropna(axis=1, how="all")
             .sort_index()
         )
-        st.dataframe(risk_crosstab, use_container_width=True)
+        st.dataframe(
+            risk_crosstab.style.format("{:.3f}", na_rep=""),
+            use_container_width=True,
+        )
 
     st.markdown("#### Lead time by region and shipping mode")
+    lt_g = fcube.groupby(["order_region", "shipping_mode"], observed=True)[
+        ["lt_sum", "n"]
+    ].sum()
+    # The cube's per-cell order counts can't be rolled up here: orders span
+    # multiple categories, so summing cells keyed by category double-counts
+    # them. Dedupe the raw filtered rows on the keys actually grouped by.
+    lt_orders = (
+        data.drop_duplicates(["order_region", "shipping_mode", "order_id"])
+        .groupby(["order_region", "shipping_mode"], observed=True)
+        .size()
+    )
     lt_region_mode = (
-        data.groupby(["order_region", "shipping_mode"])
-        .agg(
-            avg_lead_time=("lead_time_days", "mean"),
-            orders=("order_id", "nunique"),
-        )
-        .round(2)
-        .reset_index()
+        pd.DataFrame(
+            {
+                "avg_lead_time": lt_g["lt_sum"] / lt_g["n"],
+                "orders": lt_orders,
+            }
+        ).reset_index()
+    )
+    st.dataframe(
+        lt_region_mode.style.format({"avg_lead_time": "{:.2f}"}),
+        use_container_width=True,
     )
-    st.dataframe(lt_region_mode, use_container_width=True)
 
 # TAB 3: PROFITABILITY
 with tab_profit:
     st.subheader("Profitability by Category & Segment")
 
     # Profit and sales by category/segment
-    cat_seg = (
-        data.groupby(["category_name", "customer_segment"])
-        .agg(
-            total_sales=("sales", "sum"),
-            total_profit=("order_profit_per_order", "sum"),
-            avg_margin=("order_profit_per_order", "mean"),
-            orders=("order_id", "nunique"),
-        )
-        .round(2)
-        .reset_index()
-    )
+    cat_seg = aggs["cat_seg"]
 
     st.markdown("#### Top 15 category x segment by sales")
     st.dataframe(
-        cat_seg.sort_values("total_sales", ascending=False).head(15),
+        cat_seg.nlargest(15, "total_sales")
+        .style.format(
+            {
+                "total_sales": "{:,.2f}",
+                "total_profit": "{:,.2f}",
+                "avg_margin": "{:.2f}",
+            }
+        ),
         use_container_width=True,
     )
 
     st.markdown("#### Profitability by region")
-    region_profit = (
-        data.groupby("order_region")
-        .agg(
-            total_sales=("sales", "sum"),
-            total_profit=("order_profit_per_order", "sum"),
-            avg_profit_per_order=("order_profit_per_order", "mean"),
-        )
-        .round(2)
-        .reset_index()
+    region_profit = aggs["region_profit"]
+    st.dataframe(
+        region_profit.style.format(
+            {
+                "total_sales": "{:,.2f}",
+                "total_profit": "{:,.2f}",
+                "avg_profit_per_order": "{:.2f}",
+            }
+        ),
+        use_container_width=True,
     )
-    st.dataframe(region_profit, use_container_width=True)
 
     st.markdown("#### High revenue, high delay pockets")
-    high_delay = (
-        data.groupby(["order_region", "shipping_mode"])
-        .agg(
-            total_sales=("sales", "sum"),
-            late_risk=("late_delivery_risk", "mean"),
-            avg_lead_time=("lead_time_days", "mean"),
-        )
-        .round(3)
-        .reset_index()
-    )
-    high_delay = high_delay.sort_values(
-        ["late_risk", "total_sales"], ascending=[False, False]
+    # nlargest = partial sort: O(N log 15) instead of sorting the whole
+    # aggregate only to keep 15 rows.
+    high_delay = aggs["high_delay"].nlargest(15, ["late_risk", "total_sales"])
+    st.dataframe(
+        high_delay.style.format(
+            {
+                "total_sales": "{:,.2f}",
+                "late_risk": "{:.3f}",
+                "avg_lead_time": "{:.3f}",
+            }
+        ),
+        use_container_width=True,
     )
-    st.dataframe(high_delay.head(15), use_container_width=True)